@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
 import os
 import glob
+import json
+import threading
 
 # Page Config
 st.set_page_config(page_title="Vehicle Data Analysis", layout="wide")
@@ -12,21 +19,168 @@ st.set_page_config(page_title="Vehicle Data Analysis", layout="wide")
 st.title("🚗 Vehicle Data Analysis Dashboard")
 st.markdown("Analysis of 15 weeks of driving data based on 7 key parameters.")
 
+# --- Fuel Consumption Calculation ---
+# Estimation based on MAF (Mass Air Flow)
+# MAF (g/s) = (Displacement (L) * RPM / 120) * AirDensity (kg/m3) * VolumetricEff * (Load/100)
+# Fuel (g/s) = MAF / AFR (14.7)
+# Fuel (L/h) = (Fuel (g/s) / FuelDensity (0.74 kg/L)) * 3600
+
+DISPLACEMENT = 1.6 # Liters
+AIR_DENSITY = 1.225
+VOL_EFF = 0.85
+AFR = 14.7
+FUEL_DENSITY = 0.74
+
+# All constants folded into one factor: Fuel (L/h) = FUEL_FACTOR * RPM * Load
+FUEL_FACTOR = (DISPLACEMENT / 120) * AIR_DENSITY * VOL_EFF / AFR / (FUEL_DENSITY * 1000) * 3600 * 0.01
+
+def calculate_fuel(rpm, load):
+    return FUEL_FACTOR * rpm * load
+
+def calculate_mileage(speed, fuel):
+    # Avoid division by zero for Mileage
+    moving = (fuel > 0) & (speed > 1)
+    return np.where(moving, speed / np.where(moving, fuel, 1.0), 0.0)
+
 # Data Loading
+# Explicit schema so the Arrow readers skip type inference on the known columns.
+# Types are sized to the physical ranges (RPM <= 7000, Gear <= 6, temps < 1000).
+# Only these columns are read; the dummy GPS/accelerometer/etc. columns are skipped.
+COLUMN_TYPES = {
+    'Time_1s': pa.int32(),
+    'Driver_ID': pa.dictionary(pa.int32(), pa.string()),
+    'Coolant': pa.float32(),
+    'RPM': pa.int16(),
+    'OBD Speed': pa.float32(),
+    'Torque': pa.float32(),
+    'Throttle_Position': pa.float32(),
+    'Engine_Load': pa.float32(),
+    'Intake_Air_Temp': pa.float32(),
+    'Catalyst_Temperature': pa.float32(),
+    'Gear': pa.int8(),
+    'Trip_Distance_m': pa.float32(),
+    'Timestamp': pa.timestamp('s'),
+}
+SCHEMA = pa.schema(list(COLUMN_TYPES.items()))
+
+def read_week(filename):
+    # Parquet is what the generator writes; CSV is still read for older data folders
+    if filename.endswith(".parquet"):
+        return pq.read_table(filename, columns=list(COLUMN_TYPES)).cast(SCHEMA)
+    read_options = pv.ReadOptions(use_threads=True)
+    convert_options = pv.ConvertOptions(
+        column_types=COLUMN_TYPES,
+        include_columns=list(COLUMN_TYPES)
+    )
+    return pv.read_csv(filename, read_options=read_options, convert_options=convert_options)
+
+def week_number(filename):
+    return int(os.path.splitext(os.path.basename(filename))[0].split("_")[-1])
+
+def build_data(all_files):
+    tables = [read_week(filename) for filename in all_files]
+    week_nums = [week_number(filename) for filename in all_files]
+    df = pa.concat_tables(tables).to_pandas()
+
+    # Week is stored as a categorical: one code per row instead of a repeated string
+    week_codes = np.repeat(np.arange(len(tables), dtype=np.int8), [t.num_rows for t in tables])
+    df['Week'] = pd.Categorical.from_codes(week_codes, categories=[f"Week {n}" for n in week_nums])
+    # Numeric week kept alongside the label so sorting never parses strings
+    df['WeekNum'] = np.array(week_nums, dtype=np.int16)[week_codes]
+    return df
+
+def add_derived(df):
+    # Derived columns only depend on the raw rows, so compute them once per load
+    speed = df['OBD Speed'].to_numpy(dtype=np.float64)
+    fuel = calculate_fuel(
+        df['RPM'].to_numpy(dtype=np.float64),
+        df['Engine_Load'].to_numpy(dtype=np.float64)
+    )
+    df['Fuel_Flow_L_h'] = fuel
+    df['Mileage_km_L'] = calculate_mileage(speed, fuel)
+    return df
+
+# The raw combined table is also kept on disk so a fresh process reads one file
+# instead of re-parsing every week. Derived columns are never cached, so changes
+# to the fuel model apply immediately.
+DATA_CACHE_PATH = os.path.join("data", "_all_weeks.feather")
+# Bump when the cached layout changes (e.g. how Week/WeekNum are built)
+DATA_CACHE_VERSION = 1
+
+def cache_key(all_files):
+    # Exact source files and mtimes, the read schema and the layout version:
+    # the cache is only reused when every one of these matches
+    return json.dumps({
+        'version': DATA_CACHE_VERSION,
+        'schema': str(SCHEMA),
+        'sources': [[f, os.stat(f).st_mtime_ns] for f in all_files],
+    })
+
+def read_cache(key):
+    try:
+        table = feather.read_table(DATA_CACHE_PATH, memory_map=True)
+        if (table.schema.metadata or {}).get(b'data_cache_key') != key.encode():
+            return None
+        return table.to_pandas()
+    except Exception:
+        return None # Missing, truncated or unreadable cache: rebuild it
+
+def write_cache(df, key):
+    tmp_path = None
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'data_cache_key': key.encode()})
+        # Write next to the target and swap it in, so readers never see a partial file.
+        # The name is unique per process and thread so concurrent writers don't collide.
+        tmp_path = f"{DATA_CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, DATA_CACHE_PATH)
+    except Exception:
+        # Read-only data folder or serialization error: still works, just without the disk cache
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
 @st.cache_data
 def load_data():
-    all_files = glob.glob(os.path.join("data", "*.csv"))
-    df_list = []
-    for filename in all_files:
-        df = pd.read_csv(filename)
-        week_name = os.path.basename(filename).replace(".csv", "").replace("_", " ").title()
-        df['Week'] = week_name
-        df_list.append(df)
-    
-    if not df_list:
+    all_files = (sorted(glob.glob(os.path.join("data", "*.parquet")))
+                 or sorted(glob.glob(os.path.join("data", "*.csv"))))
+    if not all_files:
         return pd.DataFrame()
-        
-    return pd.concat(df_list, ignore_index=True)
+
+    key = cache_key(all_files)
+    df = read_cache(key)
+    if df is None:
+        df = build_data(all_files)
+        write_cache(df, key)
+    return add_derived(df)
+
+@st.cache_data
+def weekly_avg_speed():
+    # Takes no arguments so reruns skip hashing the full DataFrame
+    return load_data().groupby('Week', observed=True)['OBD Speed'].mean().reset_index()
+
+@st.cache_data
+def week_ranges():
+    # Each week's rows are contiguous (one file per week, concatenated in order),
+    # so a week maps to a [start, end) row range
+    sizes = load_data().groupby('Week', sort=False, observed=True).size()
+    ends = sizes.cumsum()
+    return {week: (int(end - size), int(end)) for week, size, end in zip(sizes.index, sizes, ends)}
+
+# Everything below is keyed on the selected week, so each of the 16 filter
+# values is computed once and later reruns are cache lookups. Callers name the
+# columns they use, so only those are copied and handed to plotly.
+@st.cache_data
+def get_filtered(week, columns):
+    df = load_data()
+    columns = list(columns)
+    if week != "All Weeks":
+        start, end = week_ranges()[week]
+        return df.iloc[start:end][columns]
+    return df[columns]
 
 try:
     df = load_data()
@@ -40,52 +194,28 @@ if df.empty:
 
 # Sidebar
 st.sidebar.header("Filter Data")
-week_options = ["All Weeks"] + sorted(df['Week'].unique().tolist(), key=lambda x: int(x.split()[-1]))
+week_options = ["All Weeks"] + [f"Week {n}" for n in np.sort(df['WeekNum'].unique())]
 selected_week = st.sidebar.selectbox("Select Week", week_options)
 
-if selected_week != "All Weeks":
-    filtered_df = df[df['Week'] == selected_week]
-else:
-    filtered_df = df
+filtered_df = get_filtered(selected_week, ('Trip_Distance_m', 'OBD Speed', 'RPM', 'Fuel_Flow_L_h'))
 
 # Metrics
+# All sidebar aggregates in one agg() call over the filtered columns
+stats = filtered_df.agg({
+    'Trip_Distance_m': 'max',
+    'OBD Speed': 'max',
+    'RPM': 'mean',
+    'Fuel_Flow_L_h': 'sum',
+})
+
 st.sidebar.subheader("Quick Stats")
-total_distance_km = filtered_df['Trip_Distance_m'].max() / 1000
+total_distance_km = stats['Trip_Distance_m'] / 1000
 st.sidebar.metric("Total Distance", f"{total_distance_km:.2f} km")
-st.sidebar.metric("Max Speed", f"{filtered_df['OBD Speed'].max()} km/h")
-st.sidebar.metric("Avg RPM", f"{int(filtered_df['RPM'].mean())}")
-
-# --- Fuel Consumption Calculation ---
-# Estimation based on MAF (Mass Air Flow)
-# MAF (g/s) = (Displacement (L) * RPM / 120) * AirDensity (kg/m3) * VolumetricEff * (Load/100)
-# Fuel (g/s) = MAF / AFR (14.7)
-# Fuel (L/h) = (Fuel (g/s) / FuelDensity (0.74 kg/L)) * 3600
-
-DISPLACEMENT = 1.6 # Liters
-AIR_DENSITY = 1.225
-VOL_EFF = 0.85
-AFR = 14.7
-FUEL_DENSITY = 0.74
-
-def calculate_fuel(row):
-    rpm = row['RPM']
-    load = row['Engine_Load']
-    
-    maf = (DISPLACEMENT * rpm / 120) * AIR_DENSITY * VOL_EFF * (load / 100)
-    fuel_g_s = maf / AFR
-    fuel_l_h = (fuel_g_s / (FUEL_DENSITY * 1000)) * 3600
-    return fuel_l_h
-
-filtered_df['Fuel_Flow_L_h'] = filtered_df.apply(calculate_fuel, axis=1)
-
-# Avoid division by zero for Mileage
-filtered_df['Mileage_km_L'] = filtered_df.apply(
-    lambda x: x['OBD Speed'] / x['Fuel_Flow_L_h'] if x['Fuel_Flow_L_h'] > 0 and x['OBD Speed'] > 1 else 0, 
-    axis=1
-)
+st.sidebar.metric("Max Speed", f"{stats['OBD Speed']:.1f} km/h")
+st.sidebar.metric("Avg RPM", f"{int(stats['RPM'])}")
 
 # Calculate Average Mileage for the selected period
-total_fuel_consumed = (filtered_df['Fuel_Flow_L_h'] * 1/3600).sum() # L/h * h (1s steps)
+total_fuel_consumed = stats['Fuel_Flow_L_h'] / 3600 # L/h * h (1s steps)
 if total_fuel_consumed > 0:
     avg_mileage = total_distance_km / total_fuel_consumed
 else:
@@ -96,67 +226,101 @@ st.sidebar.metric("Total Fuel", f"{total_fuel_consumed:.2f} L")
 
 # --- Analysis Sections ---
 
+# Scatter plots are drawn with WebGL and thinned to an even stride above this size.
+# At 1 Hz sampling neighbouring points overlap anyway, so the shape is unchanged.
+MAX_SCATTER_POINTS = 20000
+
+def downsample(data, max_points=MAX_SCATTER_POINTS):
+    step = -(-len(data) // max_points)
+    return data.iloc[::step] if step > 1 else data
+
 # 0. Mileage Analysis
+@st.cache_data
+def build_fig0(week):
+    data = get_filtered(week, ('OBD Speed', 'Mileage_km_L', 'Gear'))
+    return px.scatter(downsample(data[data['Mileage_km_L'] < 50]), x="OBD Speed", y="Mileage_km_L", 
+                      color="Gear", title="Instant Mileage (km/L) vs Speed", render_mode="webgl")
+
 st.header("0️⃣ Fuel Efficiency Analysis")
 st.markdown(f"**Average Mileage:** {avg_mileage:.2f} km/L")
-fig0 = px.scatter(filtered_df[filtered_df['Mileage_km_L'] < 50], x="OBD Speed", y="Mileage_km_L", 
-                  color="Gear", title="Instant Mileage (km/L) vs Speed")
-st.plotly_chart(fig0, use_container_width=True)
+st.plotly_chart(build_fig0(selected_week), use_container_width=True)
 
 
 # 1. Speed vs RPM
+@st.cache_data
+def build_fig1(week):
+    return px.scatter(downsample(get_filtered(week, ('OBD Speed', 'RPM', 'Gear'))), x="OBD Speed", y="RPM", color="Gear", 
+                      title="Speed vs RPM (Colored by Gear)", opacity=0.5, render_mode="webgl")
+
 st.header("1️⃣ Speed vs RPM")
 st.markdown("**Purpose:** Check gear efficiency. Linear lines indicate gears.")
-fig1 = px.scatter(filtered_df, x="OBD Speed", y="RPM", color="Gear", 
-                  title="Speed vs RPM (Colored by Gear)", opacity=0.5)
-st.plotly_chart(fig1, use_container_width=True)
+st.plotly_chart(build_fig1(selected_week), use_container_width=True)
 
 # 2. Throttle Position vs RPM
+@st.cache_data
+def build_fig2(week):
+    return px.density_heatmap(get_filtered(week, ('RPM', 'Throttle_Position')), x="RPM", y="Throttle_Position", 
+                              title="Throttle Position vs RPM Density", nbinsx=30, nbinsy=30)
+
 st.header("2️⃣ Throttle Position vs RPM")
 st.markdown("**Purpose:** Study acceleration behavior. High throttle at low RPM can indicate lugging.")
-fig2 = px.density_heatmap(filtered_df, x="RPM", y="Throttle_Position", 
-                          title="Throttle Position vs RPM Density", nbinsx=30, nbinsy=30)
-st.plotly_chart(fig2, use_container_width=True)
+st.plotly_chart(build_fig2(selected_week), use_container_width=True)
 
 # 3. Engine Load vs Speed
+@st.cache_data
+def build_fig3(week):
+    return px.scatter(downsample(get_filtered(week, ('OBD Speed', 'Engine_Load', 'Gear'))), x="OBD Speed", y="Engine_Load", color="Gear",
+                      title="Engine Load vs Speed", opacity=0.5, render_mode="webgl")
+
 st.header("3️⃣ Engine Load vs Speed")
 st.markdown("**Purpose:** Analyze engine stress. High load at low speed is stressful.")
-fig3 = px.scatter(filtered_df, x="OBD Speed", y="Engine_Load", color="Gear",
-                  title="Engine Load vs Speed", opacity=0.5)
-st.plotly_chart(fig3, use_container_width=True)
+st.plotly_chart(build_fig3(selected_week), use_container_width=True)
 
 # 4. Idle Time vs RPM
+@st.cache_data
+def build_fig4(week):
+    data = get_filtered(week, ('OBD Speed', 'RPM'))
+    idle_df = data[data['OBD Speed'] < 1]
+    return px.histogram(idle_df, x="RPM", title="RPM Distribution during Idle (Speed < 1 km/h)")
+
 st.header("4️⃣ Idle Time vs RPM")
 st.markdown("**Purpose:** Detect unnecessary idling.")
-idle_df = filtered_df[filtered_df['OBD Speed'] < 1]
-fig4 = px.histogram(idle_df, x="RPM", title="RPM Distribution during Idle (Speed < 1 km/h)")
-st.plotly_chart(fig4, use_container_width=True)
+st.plotly_chart(build_fig4(selected_week), use_container_width=True)
 
 # 5. Catalyst Temperature vs Speed
+@st.cache_data
+def build_fig5(week):
+    return px.scatter(downsample(get_filtered(week, ('OBD Speed', 'Catalyst_Temperature', 'Engine_Load'))), x="OBD Speed", y="Catalyst_Temperature", 
+                      title="Catalyst Temperature vs Speed", color="Engine_Load", render_mode="webgl")
+
 st.header("5️⃣ Catalyst Temperature vs Speed")
 st.markdown("**Purpose:** Monitor emission system performance.")
-fig5 = px.scatter(filtered_df, x="OBD Speed", y="Catalyst_Temperature", 
-                  title="Catalyst Temperature vs Speed", color="Engine_Load")
-st.plotly_chart(fig5, use_container_width=True)
+st.plotly_chart(build_fig5(selected_week), use_container_width=True)
 
 # 6. Intake Air Temperature vs RPM
+@st.cache_data
+def build_fig6(week):
+    return px.scatter(downsample(get_filtered(week, ('RPM', 'Intake_Air_Temp'))), x="RPM", y="Intake_Air_Temp", 
+                      title="Intake Air Temperature vs RPM", opacity=0.5, render_mode="webgl")
+
 st.header("6️⃣ Intake Air Temperature vs RPM")
 st.markdown("**Purpose:** Shows air–fuel efficiency context.")
-fig6 = px.scatter(filtered_df, x="RPM", y="Intake_Air_Temp", 
-                  title="Intake Air Temperature vs RPM", opacity=0.5)
-st.plotly_chart(fig6, use_container_width=True)
+st.plotly_chart(build_fig6(selected_week), use_container_width=True)
 
 # 7. Vehicle Speed vs Distance/Trip Time
+@st.cache_data
+def build_fig7(week):
+    # For this plot, if "All Weeks" is selected, it might be too messy, so we limit or aggregate
+    if week == "All Weeks":
+        # Show a sample or aggregate
+        daily_avg = weekly_avg_speed()
+        return px.bar(daily_avg, x='Week', y='OBD Speed', title="Average Speed per Week")
+    return px.line(get_filtered(week, ('Time_1s', 'OBD Speed')), x="Time_1s", y="OBD Speed", title=f"Speed Profile - {week}")
+
 st.header("7️⃣ Vehicle Speed vs Distance/Trip Time")
 st.markdown("**Purpose:** Shows driving consistency and trip profile.")
-# For this plot, if "All Weeks" is selected, it might be too messy, so we limit or aggregate
 if selected_week == "All Weeks":
     st.info("Select a specific week to see detailed time-series data.")
-    # Show a sample or aggregate
-    daily_avg = df.groupby('Week')['OBD Speed'].mean().reset_index()
-    fig7 = px.bar(daily_avg, x='Week', y='OBD Speed', title="Average Speed per Week")
-else:
-    fig7 = px.line(filtered_df, x="Time_1s", y="OBD Speed", title=f"Speed Profile - {selected_week}")
-st.plotly_chart(fig7, use_container_width=True)
+st.plotly_chart(build_fig7(selected_week), use_container_width=True)
 
 st.success("Dashboard Loaded Successfully!")
@@ -2,8 +2,18 @@ import pandas as pd
 import numpy as np
 import os
 import random
+from multiprocessing import Pool
 from datetime import datetime, timedelta
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional: without it the simulation runs as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
 # Configuration
 OUTPUT_FOLDER = 'data'
 NUM_WEEKS = 15
@@ -18,55 +28,51 @@ FINAL_DRIVE = 3.5
 TIRE_RADIUS = 0.3  # meters
 MIN_SPEED_FOR_GEAR = [0, 15, 30, 50, 70, 90]  # km/h
 
+# Scenario codes used inside the compiled simulation kernel
+SCENARIOS = {'city': 0, 'highway': 1, 'mixed': 2, 'aggressive': 3, 'inefficient': 4, 'idle': 5}
+CITY, HIGHWAY, MIXED, AGGRESSIVE, INEFFICIENT, IDLE = range(6)
+
+# Array copies of the gear tables so numba can freeze them as constants
+_GEAR_RATIOS = np.array(GEAR_RATIOS, dtype=np.float64)
+_MIN_SPEED_FOR_GEAR = np.array(MIN_SPEED_FOR_GEAR, dtype=np.float64)
+
 def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def simulate_trip(duration_seconds, scenario='mixed'):
+@njit(cache=True)
+def _drive_core(scenario_id, targets, throttle_noise):
     """
-    Simulates a driving trip.
-    scenario: 'city', 'highway', 'mixed', 'aggressive', 'inefficient'
+    Driver and speed physics of simulate_trip. Returns speed and throttle per second.
+    targets: target speed per minute; throttle_noise: one draw per second.
     """
-    data = []
+    duration_seconds = len(throttle_noise)
     
-    # Initial state
-    speed = 0  # km/h
-    rpm = IDLE_RPM
-    throttle = 0  # 0-100
-    load = 15  # 0-100
-    coolant_temp = 25  # Celsius
-    intake_temp = 20
-    catalyst_temp = 100
-    distance = 0
+    # Kept in float64: later stages derive gear, RPM and temperatures from these
+    speed_arr = np.empty(duration_seconds)
+    throttle_arr = np.empty(duration_seconds)
     
-    target_speed = 0
+    # Initial state
+    speed = 0.0  # km/h
+    throttle = 0.0  # 0-100
     
     for t in range(duration_seconds):
-        # 1. Determine Target Speed based on Scenario
-        if t % 60 == 0: # Change target every minute
-            if scenario == 'highway':
-                target_speed = random.uniform(80, 120)
-            elif scenario == 'city':
-                target_speed = random.uniform(0, 50)
-            elif scenario == 'idle':
-                target_speed = 0
-            else: # mixed
-                target_speed = random.uniform(0, 100)
+        target_speed = targets[t // 60]
                 
         # 2. Driver Input (Throttle/Brake)
         speed_diff = target_speed - speed
         
-        if scenario == 'aggressive':
+        if scenario_id == AGGRESSIVE:
             accel_factor = 2.0
         else:
             accel_factor = 0.5
             
         if speed_diff > 5:
-            throttle = min(100, throttle + 5 * accel_factor)
+            throttle = min(100.0, throttle + 5 * accel_factor)
         elif speed_diff < -5:
-            throttle = 0 # Braking
+            throttle = 0.0 # Braking
         else:
-            throttle = max(0, min(100, throttle + random.uniform(-2, 2))) # Maintain
+            throttle = max(0.0, min(100.0, throttle + throttle_noise[t])) # Maintain
             
         # 3. Physics Update (Speed)
         if throttle > 0:
@@ -75,109 +81,161 @@ def simulate_trip(duration_seconds, scenario='mixed'):
         else:
             speed -= 0.5 # Coasting/Braking friction
             
-        speed = max(0, speed)
+        speed = max(0.0, speed)
         
-        # 4. Gear Selection & RPM
-        gear = 1
-        for i, limit in enumerate(MIN_SPEED_FOR_GEAR):
-            if speed > limit:
-                gear = i + 1
+        speed_arr[t] = speed
+        throttle_arr[t] = throttle
         
-        # Anomaly: Wrong Gear (High RPM at low speed)
-        if scenario == 'inefficient' and speed > 20 and speed < 50:
-            gear = 1 # Force 1st gear
-            
-        # Calculate RPM
-        # RPM = (Speed_m_s * 60 * FinalDrive * GearRatio) / (2 * pi * Radius)
-        speed_ms = speed * 1000 / 3600
-        if speed < 1:
-            rpm = IDLE_RPM + (throttle * 20) # Revving in neutral/stopped
-        else:
-            ratio = GEAR_RATIOS[gear-1]
-            calc_rpm = (speed_ms * 60 * FINAL_DRIVE * ratio) / (2 * 3.14159 * TIRE_RADIUS)
-            rpm = max(IDLE_RPM, min(MAX_RPM, calc_rpm))
-            
-        # 5. Engine Load
-        # Load is high when accelerating hard or climbing (random noise)
-        base_load = (throttle * 0.8) + (speed * 0.1)
-        load = min(100, max(10, base_load + random.uniform(-5, 5)))
+    return speed_arr, throttle_arr
+
+@njit(cache=True)
+def _thermal_core(rpm_arr, load_arr):
+    """
+    Coolant and catalyst temperatures of simulate_trip. Both depend on their
+    previous value, so they are the only engine signals left in a loop.
+    """
+    duration_seconds = len(rpm_arr)
+    
+    coolant_arr = np.empty(duration_seconds)
+    catalyst_arr = np.empty(duration_seconds)
+    
+    # Initial state
+    coolant_temp = 25.0  # Celsius
+    catalyst_temp = 100.0
+    
+    for t in range(duration_seconds):
+        rpm = rpm_arr[t]
         
-        # Anomaly: High Load at Low Speed (Lugging)
-        if scenario == 'inefficient' and speed > 10 and speed < 30 and gear > 3:
-             load = 90
-             
-        # 6. Temperatures
         # Coolant warms up to ~90
         target_coolant = 90
         if coolant_temp < target_coolant:
             coolant_temp += 0.05 + (rpm/10000)
-            
-        # Intake temp (ambient + heat soak)
-        intake_temp = 20 + (coolant_temp * 0.1) - (speed * 0.05) # Airflow cools it
-        intake_temp = max(20, intake_temp)
         
         # Catalyst Temp (depends on load/rpm)
-        target_cat = 400 + (rpm * 0.05) + (load * 2)
+        target_cat = 400 + (rpm * 0.05) + (load_arr[t] * 2)
         catalyst_temp += (target_cat - catalyst_temp) * 0.01
         
-        # 7. Distance
-        distance += speed_ms # meters per second
-        
-        # 8. Store Data
-        # Mapping to CSV columns
-        row = {
-            'Time_1s': t, # Relative time in file
-            'Driver_ID': 'SimDriver_01',
-            'LapID': 1, # Dummy
-            'GPS Longitude': 0, # Dummy
-            'GPS Latitude': 0, # Dummy
-            'GPS Bearing': 0, # Dummy
-            'Accelerometer (Total)': 0, # Dummy
-            'Accelerometer (X)': 0,
-            'Accelerometer (Y)': 0,
-            'Accelerometer (Z)': 0,
-            'Coolant': round(coolant_temp, 1),
-            'RPM': int(rpm),
-            'Altitude(GPS)': 100,
-            'OBD Speed': round(speed, 1),
-            'kff1298': 0, # Unknown column, keeping 0
-            'Torque': round(load * 3, 1), # Simulated torque
-            'F_M': 0,
-            'AuthorisedClass': 'Car',
-            # NEW COLUMNS FOR ANALYSIS
-            'Throttle_Position': round(throttle, 1),
-            'Engine_Load': round(load, 1),
-            'Intake_Air_Temp': round(intake_temp, 1),
-            'Catalyst_Temperature': round(catalyst_temp, 1),
-            'Gear': gear,
-            'Trip_Distance_m': round(distance, 1)
-        }
-        data.append(row)
+        coolant_arr[t] = coolant_temp
+        catalyst_arr[t] = catalyst_temp
         
+    return coolant_arr, catalyst_arr
+
+def simulate_trip(duration_seconds, scenario='mixed', seed=None):
+    """
+    Simulates a driving trip.
+    scenario: 'city', 'highway', 'mixed', 'aggressive', 'inefficient', 'idle'
+    """
+    rng = np.random.default_rng(seed)
+    scenario_id = SCENARIOS.get(scenario, MIXED)
+    
+    # 1. Determine Target Speed based on Scenario
+    # One target per minute, drawn up front instead of inside the loop
+    n_minutes = duration_seconds // 60 + 1
+    if scenario_id == HIGHWAY:
+        targets = rng.uniform(80, 120, n_minutes)
+    elif scenario_id == CITY:
+        targets = rng.uniform(0, 50, n_minutes)
+    elif scenario_id == IDLE:
+        targets = np.zeros(n_minutes)
+    else: # mixed
+        targets = rng.uniform(0, 100, n_minutes)
+    
+    # Per-second driver/road noise, drawn in one call each
+    throttle_noise = rng.uniform(-2, 2, duration_seconds)
+    load_noise = rng.uniform(-5, 5, duration_seconds)
+    
+    speed, throttle = _drive_core(scenario_id, targets, throttle_noise)
+    
+    # 4. Gear Selection: highest gear whose minimum speed is below the current speed
+    gear = np.searchsorted(_MIN_SPEED_FOR_GEAR, speed, side='left').clip(1, len(GEAR_RATIOS)).astype(np.int8)
+    
+    # Anomaly: Wrong Gear (High RPM at low speed)
+    if scenario_id == INEFFICIENT:
+        gear[(speed > 20) & (speed < 50)] = 1 # Force 1st gear
+    
+    # Calculate RPM
+    # RPM = (Speed_m_s * 60 * FinalDrive * GearRatio) / (2 * pi * Radius)
+    speed_ms = speed * 1000 / 3600
+    calc_rpm = (speed_ms * 60 * FINAL_DRIVE * _GEAR_RATIOS[gear - 1]) / (2 * 3.14159 * TIRE_RADIUS)
+    rpm = np.where(speed < 1,
+                   IDLE_RPM + (throttle * 20), # Revving in neutral/stopped
+                   np.clip(calc_rpm, IDLE_RPM, MAX_RPM))
+    
+    # 5. Engine Load
+    # Load is high when accelerating hard or climbing (random noise)
+    base_load = (throttle * 0.8) + (speed * 0.1)
+    load = np.clip(base_load + load_noise, 10, 100)
+    
+    # Anomaly: High Load at Low Speed (Lugging)
+    if scenario_id == INEFFICIENT:
+        load[(speed > 10) & (speed < 30) & (gear > 3)] = 90
+    
+    # 6. Temperatures
+    coolant, catalyst = _thermal_core(rpm, load)
+    
+    # Intake temp (ambient + heat soak)
+    intake = np.maximum(20 + (coolant * 0.1) - (speed * 0.05), 20) # Airflow cools it
+    
+    # 7. Distance
+    distance = np.cumsum(speed_ms) # meters per second
+    
+    # Mapping to CSV columns
+    data = {
+        'Time_1s': np.arange(duration_seconds, dtype=np.int32), # Relative time in file
+        'Driver_ID': 'SimDriver_01',
+        'LapID': 1, # Dummy
+        'GPS Longitude': 0, # Dummy
+        'GPS Latitude': 0, # Dummy
+        'GPS Bearing': 0, # Dummy
+        'Accelerometer (Total)': 0, # Dummy
+        'Accelerometer (X)': 0,
+        'Accelerometer (Y)': 0,
+        'Accelerometer (Z)': 0,
+        'Coolant': np.round(coolant, 1).astype(np.float32),
+        'RPM': rpm.astype(np.int16),
+        'Altitude(GPS)': 100,
+        'OBD Speed': np.round(speed, 1).astype(np.float32),
+        'kff1298': 0, # Unknown column, keeping 0
+        'Torque': np.round(load * 3, 1).astype(np.float32), # Simulated torque
+        'F_M': 0,
+        'AuthorisedClass': 'Car',
+        # NEW COLUMNS FOR ANALYSIS
+        'Throttle_Position': np.round(throttle, 1).astype(np.float32),
+        'Engine_Load': np.round(load, 1).astype(np.float32),
+        'Intake_Air_Temp': np.round(intake, 1).astype(np.float32),
+        'Catalyst_Temperature': np.round(catalyst, 1).astype(np.float32),
+        'Gear': gear,
+        'Trip_Distance_m': np.round(distance, 1).astype(np.float32)
+    }
     return pd.DataFrame(data)
 
+def _gen_week(week, scenario, seed):
+    print(f"Generating Week {week}...")
+    
+    # Generate data
+    df = simulate_trip(DATA_POINTS_PER_WEEK, scenario=scenario, seed=seed)
+    
+    # Add timestamps
+    week_start = START_DATE + timedelta(weeks=week-1)
+    df['Timestamp'] = pd.date_range(start=week_start, periods=len(df), freq='1s')
+    
+    # Save
+    filename = os.path.join(OUTPUT_FOLDER, f'week_{week}.parquet')
+    df.to_parquet(filename, compression='zstd', index=False)
+    print(f"Saved {filename}")
+
 def main():
     ensure_dir(OUTPUT_FOLDER)
     
-    scenarios = ['city', 'highway', 'mixed', 'aggressive', 'inefficient', 'idle']
+    scenarios = list(SCENARIOS)
     
-    for week in range(1, NUM_WEEKS + 1):
-        print(f"Generating Week {week}...")
-        
-        # Pick a dominant scenario for the week or mix them
-        week_scenario = random.choice(scenarios)
-        
-        # Generate data
-        df = simulate_trip(DATA_POINTS_PER_WEEK, scenario=week_scenario)
-        
-        # Add timestamps
-        week_start = START_DATE + timedelta(weeks=week-1)
-        df['Timestamp'] = [week_start + timedelta(seconds=i) for i in range(len(df))]
-        
-        # Save
-        filename = os.path.join(OUTPUT_FOLDER, f'week_{week}.csv')
-        df.to_csv(filename, index=False)
-        print(f"Saved {filename}")
+    # Pick a dominant scenario and a seed for each week up front, so the
+    # weeks share no state and can be generated in parallel
+    args = [(week, random.choice(scenarios), random.randrange(2**32))
+            for week in range(1, NUM_WEEKS + 1)]
+    
+    with Pool() as pool:
+        pool.starmap(_gen_week, args)
 
 if __name__ == "__main__":
     main()